@@ -0,0 +1,30 @@
+import requests
+import json
+from json_lib import find_all_paths_of_value_substring, stream_extract_to_file
+
+#To Run this code in the terminal, use the following command:
+# python3 example6.py
+#If the run is interrupted, running it again resumes after the last ORCID written to the CSV.
+
+
+def fetch_publications(orcid_id: str) -> dict:
+    api_url = f"https://api.openalex.org/works?filter=author.orcid%3A{orcid_id}"
+    response = requests.get(api_url)
+    return json.loads(response.text)
+
+
+orcids = ["0000-0001-6951-2336", "0000-0003-0232-2196", "0000-0002-6498-9212", "0000-0002-1236-849X", "0000-0003-4276-073X", "0000-0002-6775-7919", "0000-0001-8233-3754", "0000-0002-2378-4720", "0000-0002-7629-0636", "0000-0003-4912-9764", "0000-0003-0353-1133", "0000-0002-0905-3980", "0000-0001-6375-262X", "0000-0002-4437-1343", "0000-0002-9108-2261", "0000-0001-7089-0510","0000-0002-1118-4998","0000-0001-8559-452X"]
+
+search_values = ['Chan', 'Zuckerberg', 'CZID', 'Biohub', 'CZI']
+keys_to_search = ['title', 'doi', 'type']
+
+# Rows are written in chunks while the next ORCIDs are still being fetched
+rows_written = stream_extract_to_file(orcids, fetch_publications, search_values, keys_to_search,
+                                      'example6_streamed_substring_search_output.csv',
+                                      find_paths=find_all_paths_of_value_substring,
+                                      find_kwargs={'match_type': 'substring'},
+                                      source_column='orcid',
+                                      chunk_size=100,
+                                      checkpoint_path='example6_streamed_substring_search_output.checkpoint')
+
+print(f"{rows_written} rows written")
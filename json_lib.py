@@ -1,10 +1,21 @@
 
+import json
+import os
+import queue
+import threading
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, date, timedelta, timezone
 from typing import Tuple
 from collections import namedtuple
-from typing import List, Union, Any, Generator
+from typing import List, Union, Any, Generator, Callable, Pattern, Iterable
 from difflib import SequenceMatcher
+import re
+
+try:
+    from re import _parser as _regex_parser, _constants as _regex_constants
+except ImportError:  # Python < 3.11
+    import sre_parse as _regex_parser, sre_constants as _regex_constants
 
 
 
@@ -29,6 +40,17 @@ def find_all_paths_of_value_fuzzy(value: Any, input_dict: Union[dict, list], pat
     
     if path is None:
         path = []  # Initialize path if None
+
+    if isinstance(input_dict, FlatJSON):
+        if match_type == "fuzzy":
+            mask = input_dict.string_mask(lambda s: similarity_ratio(s, value) >= fuzzy_threshold)
+        else:
+            mask = input_dict.value_mask(value, ignore_case=(match_type == "ignore_case"))
+        if mask is not None:
+            for found_path, found_value in input_dict.paths_where(mask, with_values=True):
+                yield (path + found_path, found_value)
+            return
+        input_dict = input_dict.to_python()  # Dicts and lists are compared on the rebuilt document
     
     compare_value = value
     if match_type == "ignore_case" and isinstance(value, str):
@@ -82,6 +104,18 @@ def find_all_paths_of_value_substring(value: Any, input_dict: Union[dict, list],
     if path is None:
         path = []  # Initialize path if None
 
+    if isinstance(input_dict, FlatJSON):
+        if match_type == "substring":
+            compare_value = value.lower() if isinstance(value, str) else value
+            mask = input_dict.string_mask(lambda s: compare_value in s.lower())
+        else:
+            mask = input_dict.value_mask(value, ignore_case=(match_type == "ignore_case"))
+        if mask is not None:
+            for found_path, found_value in input_dict.paths_where(mask, with_values=True):
+                yield (path + found_path, found_value)
+            return
+        input_dict = input_dict.to_python()  # Dicts and lists are compared on the rebuilt document
+
     compare_value = value
     if match_type in ("ignore_case", "substring") and isinstance(value, str):
         compare_value = value.lower()
@@ -116,6 +150,188 @@ def find_all_paths_of_value_substring(value: Any, input_dict: Union[dict, list],
                 yield from find_all_paths_of_value_substring(value, item, new_path, match_type)
 
 
+def _required_literals(items: Any, case_insensitive: bool) -> List[Tuple[str, ...]]:
+    # Helper function to collect, from a parsed regex, the literal substrings every match must contain.
+    # Each entry is a tuple of alternatives, at least one of which must occur in a matching string.
+    requirements = []
+    run = []
+
+    def close_run():
+        if run:
+            requirements.append(("".join(run),))
+            run.clear()
+
+    for op, av in items:
+        if op is _regex_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        close_run()
+        if op is _regex_constants.SUBPATTERN:
+            add_flags, sub_items = av[1], av[3]
+            if case_insensitive or not add_flags & _regex_constants.SRE_FLAG_IGNORECASE:
+                requirements.extend(_required_literals(sub_items, case_insensitive))
+        elif op in (_regex_constants.MAX_REPEAT, _regex_constants.MIN_REPEAT, getattr(_regex_constants, "POSSESSIVE_REPEAT", None)):
+            if av[0] >= 1:
+                requirements.extend(_required_literals(av[2], case_insensitive))
+        elif op is getattr(_regex_constants, "ATOMIC_GROUP", None):
+            requirements.extend(_required_literals(av, case_insensitive))
+        elif op is _regex_constants.BRANCH:
+            # A branch only constrains the input if every alternative requires something
+            alternatives = []
+            for branch in av[1]:
+                branch_requirements = _required_literals(branch, case_insensitive)
+                if not branch_requirements:
+                    alternatives = None
+                    break
+                alternatives.extend(max(branch_requirements, key=lambda r: min(len(lit) for lit in r)))
+            if alternatives:
+                requirements.append(tuple(dict.fromkeys(alternatives)))
+    close_run()
+    return requirements
+
+
+_case_ambiguous_chars = None  # Built on first case-insensitive prefilter
+
+
+def _fold_required_literals(requirements: List[Tuple[str, ...]]) -> List[Tuple[str, ...]]:
+    # Helper function to lowercase required literals for a case-insensitive prefilter.
+    # re.IGNORECASE pairs some characters that str.lower() keeps apart (e.g. 's' and 'ſ', 'σ' and 'ς'),
+    # so each literal is cut at such characters and only its longest remaining run is required.
+    global _case_ambiguous_chars
+    if _case_ambiguous_chars is None:
+        lowers_by_upper = {}
+        for i in range(0x20000):  # Every cased character lies below U+20000
+            c = chr(i)
+            if c.lower() != c or c.upper() != c:
+                lowers_by_upper.setdefault(c.upper(), set()).add(c.lower())
+        _case_ambiguous_chars = {c for lowers in lowers_by_upper.values() if len(lowers) > 1 for c in lowers}
+
+    def longest_run(lit: str) -> str:
+        runs = [""]
+        for c in lit:
+            lowered = c.lower()
+            if len(lowered) != 1 or len(c.casefold()) != 1 or lowered in _case_ambiguous_chars:
+                runs.append("")
+            else:
+                runs[-1] += lowered
+        return max(runs, key=len)
+
+    folded = []
+    for alternatives in requirements:
+        runs = tuple(dict.fromkeys(longest_run(lit) for lit in alternatives))
+        if all(runs):  # An empty run would accept every string
+            folded.append(runs)
+    return folded
+
+
+def compile_regex_matcher(pattern: Union[str, Pattern], match_type: str = "ignore_case") -> Callable[[str], bool]:
+    """
+    Compiles a regular expression into a predicate that checks its required literal substrings with `in` before running the regex engine.
+
+    Parameters:
+    - pattern (Union[str, Pattern]): The regular expression, as a string or an already compiled pattern.
+    - match_type (str, optional): The type of match to perform ("exact" or "ignore_case"). Defaults to "ignore_case".
+
+    Returns:
+    - Callable returning True for the strings in which the regex finds a match.
+
+    Examples:
+    >>> matcher = compile_regex_matcher(r'CZI(D)?|Chan Zuckerberg')
+    >>> matcher('The czid platform'), matcher('Biohub')
+    (True, False)
+    """
+    flags = re.IGNORECASE if match_type == "ignore_case" else 0
+    compiled = pattern if isinstance(pattern, re.Pattern) else re.compile(pattern, flags)
+    if isinstance(pattern, re.Pattern) and flags and not compiled.flags & re.IGNORECASE:
+        compiled = re.compile(compiled.pattern, compiled.flags | flags)
+    case_insensitive = bool(compiled.flags & re.IGNORECASE)
+    search = compiled.search
+
+    try:
+        parsed = _regex_parser.parse(compiled.pattern, compiled.flags)
+        requirements = _required_literals(parsed, case_insensitive)
+    except Exception:  # Fall back to the regex engine alone on patterns the parser cannot read
+        requirements = []
+    if case_insensitive:
+        requirements = _fold_required_literals(requirements)
+
+    if not requirements:
+        return lambda s: search(s) is not None
+
+    def matcher(s: str) -> bool:
+        candidate = s.lower() if case_insensitive else s
+        for alternatives in requirements:
+            if not any(lit in candidate for lit in alternatives):
+                return False
+        return search(s) is not None
+
+    return matcher
+
+
+def find_all_paths_of_value_regex(pattern: Union[str, Pattern], input_dict: Union[dict, list], path: List[Union[int, str]] = None, match_type: str = "ignore_case", match_on: str = "values") -> Generator[Tuple[List[Union[int, str]], Any], None, None]:
+    """
+    Recursively searches for strings matching a regular expression in a nested dictionary or list and returns a generator yielding all paths to the matches along with the value found.
+
+    The pattern is compiled once, and the literal substrings it requires are checked with `in` before the regex engine runs, so leaves that cannot match cost no more than a substring scan.
+
+    Parameters:
+    - pattern (Union[str, Pattern]): The regular expression to search for, matched anywhere in the string (as with re.search).
+    - input_dict (Union[dict, list]): The dictionary or list to search in.
+    - path (List[Union[int, str]], optional): The path to the current location in the dictionary or list. Defaults to None.
+    - match_type (str, optional): The type of match to perform ("exact" or "ignore_case"). Defaults to "ignore_case".
+    - match_on (str, optional): Whether to match string "values", dictionary "keys", or "both". Defaults to "values".
+      A key match yields the value stored under that key and is not searched further.
+
+    Returns:
+    - Generator yielding tuples containing lists of keys/indices forming the paths to the match and the value found.
+
+    Examples:
+    >>> data = {'affiliation': 'Chan Zuckerberg Initiative', 'tools': ['CZID', 'other']}
+    >>> list(find_all_paths_of_value_regex(r'czi(d)?', data))
+    [(['tools', 0], 'CZID')]
+    >>> list(find_all_paths_of_value_regex(r'^affil', data, match_on='keys'))
+    [(['affiliation'], 'Chan Zuckerberg Initiative')]
+    """
+    if match_on not in ("values", "keys", "both"):
+        raise ValueError("'match_on' must be 'values', 'keys' or 'both'.")
+    if path is None:
+        path = []  # Initialize path if None
+
+    matcher = compile_regex_matcher(pattern, match_type)
+    match_values = match_on in ("values", "both")
+    match_keys = match_on in ("keys", "both")
+
+    if isinstance(input_dict, FlatJSON):
+        mask = np.zeros(len(input_dict), dtype=bool)
+        if match_values:
+            mask |= input_dict.string_mask(matcher)
+        if match_keys:
+            mask |= input_dict.key_mask(matcher)
+        for found_path, found_value in input_dict.paths_where(mask, with_values=True, prune=True):
+            yield (path + found_path, found_value)
+        return
+
+    yield from _find_all_paths_matching(matcher, input_dict, path, match_values, match_keys)
+
+
+def _find_all_paths_matching(matcher: Callable[[str], bool], input_dict: Union[dict, list], path: List[Union[int, str]], match_values: bool, match_keys: bool) -> Generator[Tuple[List[Union[int, str]], Any], None, None]:
+    # Recursive worker for find_all_paths_of_value_regex, reusing the already compiled matcher.
+    if isinstance(input_dict, dict):
+        for k, v in input_dict.items():
+            new_path = path + [k]
+            if (match_keys and matcher(k)) or (match_values and isinstance(v, str) and matcher(v)):
+                yield (new_path, v)  # Yield path and value
+            elif isinstance(v, (dict, list)):  # Recurse into nested dictionary or list
+                yield from _find_all_paths_matching(matcher, v, new_path, match_values, match_keys)
+    elif isinstance(input_dict, list):
+        for idx, item in enumerate(input_dict):
+            new_path = path + [idx]
+            if match_values and isinstance(item, str) and matcher(item):
+                yield (new_path, item)  # Yield path and value
+            elif isinstance(item, (dict, list)):  # Recurse into nested dictionary or list
+                yield from _find_all_paths_matching(matcher, item, new_path, match_values, match_keys)
+
+
 def find_all_paths_of_value(value: Any, input_dict: Union[dict, list], path: List[Union[int, str]] = None) -> Generator[List[Union[int, str]], None, None]:
     """
     Recursively searches for a value in a nested dictionary or list and returns a generator yielding all paths to the value.
@@ -146,6 +362,14 @@ def find_all_paths_of_value(value: Any, input_dict: Union[dict, list], path: Lis
     """
     if path is None:
         path = []
+
+    if isinstance(input_dict, FlatJSON):
+        mask = input_dict.value_mask(value, ignore_case=True)
+        if mask is not None:
+            for found_path in input_dict.paths_where(mask):
+                yield path + found_path
+            return
+        input_dict = input_dict.to_python()  # Dicts and lists are compared on the rebuilt document
     
     if isinstance(input_dict, dict):
         for k, v in input_dict.items():
@@ -173,6 +397,132 @@ def find_all_paths_of_value(value: Any, input_dict: Union[dict, list], path: Lis
 
 
 
+def _parse_iso_datetime(value: Any) -> Union[datetime, None]:
+    # Helper function to read an ISO 8601 date or datetime (as a string, date or datetime) as a naive UTC datetime.
+    # Returns None for anything that is not one.
+    if isinstance(value, str):
+        if len(value) < 10 or value[4] != "-" or not value[:4].isdigit():
+            return None  # Cheap rejection before trying to parse
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00") if value.endswith("Z") else value)
+        except ValueError:
+            return None
+    elif isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    elif not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _range_bounds(low: Any, high: Any, inclusive: bool = True) -> Tuple[str, Any, Any]:
+    # Helper function to decide whether a range is numeric or a date range, and to normalize its bounds.
+    # An inclusive date-only upper bound is moved to the last microsecond of that day.
+    bounds = [b for b in (low, high) if b is not None]
+    if not bounds:
+        raise ValueError("Specify 'low', 'high' or both.")
+    if all(isinstance(b, (int, float)) and not isinstance(b, bool) for b in bounds):
+        return "number", low, high
+    parsed = [_parse_iso_datetime(b) if b is not None else None for b in (low, high)]
+    if any(b is not None and p is None for b, p in zip((low, high), parsed)):
+        raise ValueError("'low' and 'high' must both be numbers or both be ISO dates.")
+    date_only_high = isinstance(high, str) and len(high) == 10 or isinstance(high, date) and not isinstance(high, datetime)
+    if inclusive and date_only_high:
+        parsed[1] += timedelta(days=1, microseconds=-1)
+    return "date", parsed[0], parsed[1]
+
+
+def find_all_paths_of_value_range(low: Any, high: Any, input_dict: Union[dict, list], path: List[Union[int, str]] = None, key: Union[str, List[str]] = None, inclusive: bool = True) -> Generator[Tuple[List[Union[int, str]], Any], None, None]:
+    """
+    Recursively searches for numbers or ISO dates within a range in a nested dictionary or list and returns a generator yielding all paths to them along with the value found.
+
+    On a FlatJSON the search is answered from sorted arrays of (value, node id) per key path, built on first use,
+    so a range query is a binary search rather than a full traversal.
+
+    Parameters:
+    - low (Any): The lower bound, a number or an ISO date (string, date or datetime). None for no lower bound.
+    - high (Any): The upper bound, of the same kind as `low`. None for no upper bound.
+    - input_dict (Union[dict, list]): The dictionary or list to search in.
+    - path (List[Union[int, str]], optional): The path to the current location in the dictionary or list. Defaults to None.
+    - key (Union[str, List[str]], optional): Only consider values stored under this key, or under this list of keys
+      from the root (list indices left out). Defaults to None (all values).
+    - inclusive (bool, optional): Whether values equal to a bound match. Defaults to True. With inclusive=True, a date-only `high`
+      such as '2021-12-31' covers that whole day; with inclusive=False it stops at midnight at the start of that day.
+
+    Returns:
+    - Generator yielding tuples containing lists of keys/indices forming the paths to the value and the value found.
+      Dates are yielded as the strings found in the document. Booleans never match a numeric range.
+
+    Examples:
+    >>> data = {'results': [{'publication_year': 2018, 'cited_by_count': 150}, {'publication_year': 2020, 'cited_by_count': 3}]}
+    >>> list(find_all_paths_of_value_range(2019, 2022, data, key='publication_year'))
+    [(['results', 1, 'publication_year'], 2020)]
+    >>> list(find_all_paths_of_value_range('2021-01-01', None, {'updated': '2023-05-02T10:00:00Z', 'created': '2019-12-31'}))
+    [(['updated'], '2023-05-02T10:00:00Z')]
+    >>> list(find_all_paths_of_value_range('2021-01-01', '2021-12-31', {'updated': '2021-12-31T08:00:00'}))
+    [(['updated'], '2021-12-31T08:00:00')]
+    """
+    if path is None:
+        path = []
+
+    kind, low, high = _range_bounds(low, high, inclusive)
+    key_path = tuple(key) if isinstance(key, (list, tuple)) else None
+
+    def in_range(v: Any) -> bool:
+        if kind == "number":
+            if not isinstance(v, (int, float)) or isinstance(v, bool):
+                return False
+        else:
+            v = _parse_iso_datetime(v) if isinstance(v, str) else None
+            if v is None:
+                return False
+        if inclusive:
+            return (low is None or v >= low) and (high is None or v <= high)
+        return (low is None or v > low) and (high is None or v < high)
+
+    if isinstance(input_dict, FlatJSON):
+        nodes = []
+        for leaf_key_path, (values, node_ids) in input_dict.range_index(kind).items():
+            if key is not None and (leaf_key_path != key_path if key_path is not None else leaf_key_path[-1:] != (key,)):
+                continue
+            start = 0 if low is None else np.searchsorted(values, _range_index_value(kind, low), "left")
+            stop = len(values) if high is None else np.searchsorted(values, _range_index_value(kind, high), "right")
+            found, found_values = node_ids[start:stop], values[start:stop]
+            # Values equal to a bound are re-checked exactly, as the index rounds integers beyond 2**53 to float64
+            edges = np.zeros(len(found), dtype=bool)
+            for bound in (low, high):
+                if bound is not None:
+                    edges |= found_values == _range_index_value(kind, bound)
+            keep = ~edges
+            keep[edges] = [in_range(input_dict.to_python(n)) for n in found[edges].tolist()]
+            nodes.append(found[keep])
+        for node in np.sort(np.concatenate(nodes)) if nodes else []:
+            yield (path + input_dict.path(int(node)), input_dict.to_python(int(node)))
+        return
+
+    def visit(obj: Any, current_path: List[Union[int, str]], current_keys: Tuple[str, ...]) -> Generator[Tuple[List[Union[int, str]], Any], None, None]:
+        if isinstance(obj, dict):
+            items = ((k, v, current_keys + (k,)) for k, v in obj.items())
+        elif isinstance(obj, list):
+            items = ((idx, item, current_keys) for idx, item in enumerate(obj))
+        else:
+            return
+        for k, v, leaf_keys in items:
+            new_path = current_path + [k]
+            if isinstance(v, (dict, list)):  # Recurse into nested dictionary or list
+                yield from visit(v, new_path, leaf_keys)
+            elif (key is None or (leaf_keys == key_path if key_path is not None else leaf_keys[-1:] == (key,))) and in_range(v):
+                yield (new_path, v)
+
+    yield from visit(input_dict, path, ())
+
+
+def _range_index_value(kind: str, value: Any) -> Any:
+    # Helper function to convert a range bound to the dtype of the sorted index arrays.
+    return np.datetime64(value, "us") if kind == "date" else float(value)
+
+
 def extract_parent_object(json_obj: Union[dict, list], path: List[Union[int, str]], key_or_level: Union[str, int] = None, level: int = None, key: str = None) -> Union[Any, str]:
     """
     Extract the parent object from a nested JSON structure based on the specified path.
@@ -215,7 +565,7 @@ def extract_parent_object(json_obj: Union[dict, list], path: List[Union[int, str
             return "The third argument must be either a string (key) or an integer (level)."
 
     # Validations and stopping_level determination
-    if not isinstance(json_obj, (dict, list)):
+    if not isinstance(json_obj, (dict, list, FlatJSON)):
         return "'json_obj' must be a dictionary or list."
     if (level is None and key is None) or (level is not None and key is not None):
         return "Specify either 'level' or 'key', not both or neither."
@@ -241,6 +591,20 @@ def extract_parent_object(json_obj: Union[dict, list], path: List[Union[int, str
         except ValueError:
             return "Key not found in path."
 
+    # Iterative traversal of the node table, materializing only the extracted object
+    if isinstance(json_obj, FlatJSON):
+        node = 0
+        for current_level, current_key in enumerate(path):
+            if current_level == stopping_level:
+                return json_obj.to_python(node)
+
+            child = json_obj.child(node, current_key)
+            if child < 0:
+                return "Invalid index in path." if json_obj.types[node] == FLAT_LIST else "Invalid key in path."
+            node = child
+
+        return "Extraction failed." # This line should never be reached
+
     # Iterative traversal of the path
     current_obj = json_obj
     for current_level, current_key in enumerate(path):
@@ -278,6 +642,11 @@ def find_all_paths_of_key(key: str, json_obj: Union[dict, list], path: List[Unio
     """
     if path is None:
         path = []
+
+    if isinstance(json_obj, FlatJSON):
+        for found_path in json_obj.paths_where(json_obj.key_mask(lambda k: k == key), prune=True):
+            yield path + found_path
+        return
     
     if isinstance(json_obj, dict):
         for k, v in json_obj.items():
@@ -327,6 +696,35 @@ def search_key_in_all_levels(json_obj: Union[dict, list], paths: List[List[Union
     # Convert the search_key to lowercase if case-insensitive search is enabled
     search_key_lower = search_key.lower() if case_insensitive else search_key
 
+    if isinstance(json_obj, FlatJSON):
+        # Node ids stand in for object ids. The first matching member of every dict comes from a cached array,
+        # so each level costs a few array operations however many items a list holds.
+        first_members = json_obj.first_member_index(lambda k: k and (k.lower() if case_insensitive else k) == search_key_lower)
+        searched_nodes = np.zeros(len(json_obj), dtype=bool)
+        for path in paths:
+            node = 0
+            for level in range(len(path) + 1):
+                current_path = path[:level]
+                if level:
+                    node = json_obj.child(node, path[level - 1])
+                    if node < 0:
+                        raise KeyError(path[level - 1])
+
+                if json_obj.types[node] == FLAT_LIST:
+                    candidates = json_obj.child_nodes(node)
+                    candidates = candidates[(json_obj.types[candidates] == FLAT_DICT) & ~searched_nodes[candidates]]
+                elif json_obj.types[node] != FLAT_DICT or searched_nodes[node]:
+                    continue
+                else:
+                    candidates = np.array([node])
+
+                searched_nodes[candidates] = True
+                found = first_members[candidates]
+                for member in found[found >= 0].tolist():
+                    found_key = json_obj.keys[json_obj.key_ids[member]]
+                    results.append(SearchResult(value=json_obj.to_python(member), path=current_path + [found_key]))
+        return results
+
     for path in paths:
         # Iterate from the root to the leaf to avoid reversing the result list
         for level in range(len(path) + 1):
@@ -356,4 +754,729 @@ def search_key_in_all_levels(json_obj: Union[dict, list], paths: List[List[Union
                         result = SearchResult(value=obj[found_key], path=current_path + [found_key])
                         results.append(result)
 
-    return results
\ No newline at end of file
+    return results
+
+
+# Type tags used in the flattened node table
+FLAT_NULL, FLAT_FALSE, FLAT_TRUE, FLAT_INT, FLAT_FLOAT, FLAT_STR, FLAT_DICT, FLAT_LIST = range(8)
+
+_FLAT_MAGIC = b"JPXFLAT1"
+_FLAT_ARRAYS = [
+    ("parents", "<i4"),
+    ("key_ids", "<i4"),
+    ("types", "u1"),
+    ("payloads", "<i8"),
+    ("ends", "<i4"),
+    ("floats", "<f8"),
+    ("key_offsets", "<i8"),
+    ("key_data", "u1"),
+    ("string_offsets", "<i8"),
+    ("string_data", "u1"),
+]
+_FIRST_MEMBER_CACHE_SIZE = 8  # Per-key arrays kept by FlatJSON.first_member_index
+
+
+def _encode_string_table(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    # Helper function to pack a list of strings into an offsets array and a UTF-8 byte buffer.
+    encoded = [s.encode("utf-8", "surrogatepass") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype="u1")
+
+
+def _decode_string_table(offsets: np.ndarray, data: np.ndarray) -> List[str]:
+    # Helper function to unpack a string table written by _encode_string_table.
+    raw = data.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode("utf-8", "surrogatepass") for i in range(len(bounds) - 1)]
+
+
+class FlatJSON:
+    """
+    A JSON document flattened into a compact columnar node table.
+
+    Every dict, list and scalar of the document is one node, stored in pre-order so that a node's
+    descendants are exactly the nodes ``node + 1 .. ends[node] - 1``. The table holds:
+
+    - parents: index of the parent node (-1 for the root).
+    - key_ids: for members of a dict, the id of the key in the interned key table; for items of a list, their position.
+    - types: one of the FLAT_* type tags.
+    - payloads: the integer value, the index into ``floats``, the id in the interned string table, or the number of children.
+    - ends: one past the last descendant of the node.
+
+    A FlatJSON can be saved with ``save`` and memory-mapped back with ``load_flat_json``, so a reloaded corpus needs no
+    JSON parsing. The search functions of this module accept a FlatJSON wherever they accept a dict or list.
+
+    Examples:
+    >>> flat = flatten_json({'key1': 'test value', 'key2': [1, 2.5, None]})
+    >>> list(find_all_paths_of_value('test value', flat))
+    [['key1']]
+    >>> flat.to_python()
+    {'key1': 'test value', 'key2': [1, 2.5, None]}
+    """
+
+    def __init__(self, parents: np.ndarray, key_ids: np.ndarray, types: np.ndarray, payloads: np.ndarray, ends: np.ndarray,
+                 floats: np.ndarray, key_offsets: np.ndarray, key_data: np.ndarray, string_offsets: np.ndarray, string_data: np.ndarray):
+        self.parents = parents
+        self.key_ids = key_ids
+        self.types = types
+        self.payloads = payloads
+        self.ends = ends
+        self.floats = floats
+        self.key_offsets = key_offsets
+        self.key_data = key_data
+        self.string_offsets = string_offsets
+        self.string_data = string_data
+        self.keys = _decode_string_table(key_offsets, key_data)
+        self._key_index = {k: i for i, k in enumerate(self.keys)}
+        self._strings = None  # Decoded on first use
+        self._range_indexes = {}  # Built on first range query
+        self._child_order = self._child_starts = None  # Built on first child lookup
+        self._first_member_cache = {}  # Bounded to _FIRST_MEMBER_CACHE_SIZE entries, oldest dropped first
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    @property
+    def strings(self) -> List[str]:
+        # The interned string table, decoded once on first access.
+        if self._strings is None:
+            self._strings = _decode_string_table(self.string_offsets, self.string_data)
+        return self._strings
+
+    def _child_table(self) -> Tuple[np.ndarray, np.ndarray]:
+        # All node ids grouped by parent (children in document order), and where each node's group starts. Built on first use.
+        if self._child_order is None:
+            order = np.argsort(self.parents, kind="stable").astype(np.int32)
+            self._child_starts = np.searchsorted(self.parents[order], np.arange(len(self.types)), "left").astype(np.int32)
+            self._child_order = order
+        return self._child_order, self._child_starts
+
+    def child_nodes(self, node: int) -> np.ndarray:
+        """
+        Returns the node ids of the direct children of a dict or list node, in document order.
+        """
+        if self.types[node] not in (FLAT_DICT, FLAT_LIST):
+            return np.zeros(0, dtype=np.int32)
+        order, starts = self._child_table()
+        start = int(starts[node])
+        return order[start:start + int(self.payloads[node])]
+
+    def children(self, node: int) -> Generator[int, None, None]:
+        """
+        Yields the node ids of the direct children of a dict or list node, in document order.
+        """
+        yield from self.child_nodes(node).tolist()
+
+    def child(self, node: int, key: Union[int, str]) -> int:
+        """
+        Returns the node id of the member `key` of a dict node or the item `key` of a list node, or -1 if there is none.
+        """
+        node_type = self.types[node]
+        if node_type == FLAT_DICT:
+            key_id = self._key_index.get(key) if isinstance(key, str) else None
+            if key_id is None:
+                return -1
+            members = self.child_nodes(node)
+            found = np.flatnonzero(self.key_ids[members] == key_id)
+            return int(members[found[0]]) if len(found) else -1
+        if node_type == FLAT_LIST and isinstance(key, int) and 0 <= key < self.payloads[node]:
+            order, starts = self._child_table()
+            return int(order[starts[node] + key])
+        return -1
+
+    def first_member_index(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """
+        Returns an array mapping every node to its first member whose key satisfies `predicate`, or -1 if it has none.
+        The last few arrays are cached per set of matching keys, so repeated lookups of the same key cost nothing after the first.
+        """
+        key_hits = np.fromiter((bool(predicate(k)) for k in self.keys), dtype=bool, count=len(self.keys))
+        cache_key = key_hits.tobytes()
+        first_members = self._first_member_cache.get(cache_key)
+        if first_members is None:
+            members = np.flatnonzero(self._member_mask(key_hits))
+            dicts, first = np.unique(self.parents[members], return_index=True)  # Members are in document order
+            first_members = np.full(len(self.types), -1, dtype=np.int32)
+            first_members[dicts] = members[first]
+            if len(self._first_member_cache) >= _FIRST_MEMBER_CACHE_SIZE:
+                del self._first_member_cache[next(iter(self._first_member_cache))]
+            self._first_member_cache[cache_key] = first_members
+        return first_members
+
+    def resolve(self, path: List[Union[int, str]]) -> int:
+        """
+        Returns the node id found by following `path` from the root. Raises KeyError if the path does not exist.
+        """
+        node = 0
+        for p in path:
+            node = self.child(node, p)
+            if node < 0:
+                raise KeyError(p)
+        return node
+
+    def path(self, node: int) -> List[Union[int, str]]:
+        """
+        Returns the list of keys/indices leading from the root to `node`.
+        """
+        path = []
+        parent = int(self.parents[node])
+        while parent >= 0:
+            slot = int(self.key_ids[node])
+            path.append(self.keys[slot] if self.types[parent] == FLAT_DICT else slot)
+            node, parent = parent, int(self.parents[parent])
+        path.reverse()
+        return path
+
+    def to_python(self, node: int = 0) -> Any:
+        """
+        Rebuilds the dict, list or scalar rooted at `node`.
+        """
+        node_type = self.types[node]
+        if node_type == FLAT_STR:  # Leaves skip the rebuild loop
+            return self.strings[self.payloads[node]]
+        if node_type == FLAT_INT:
+            return int(self.payloads[node])
+        end = int(self.ends[node])
+        types = self.types[node:end].tolist()
+        payloads = self.payloads[node:end].tolist()
+        parents = self.parents[node:end].tolist()
+        key_ids = self.key_ids[node:end].tolist()
+        built = []
+        for i, node_type in enumerate(types):
+            if node_type == FLAT_DICT:
+                value = {}
+            elif node_type == FLAT_LIST:
+                value = []
+            elif node_type == FLAT_STR:
+                value = self.strings[payloads[i]]
+            elif node_type == FLAT_INT:
+                value = payloads[i]
+            elif node_type == FLAT_FLOAT:
+                value = float(self.floats[payloads[i]])
+            else:
+                value = None if node_type == FLAT_NULL else node_type == FLAT_TRUE
+            if i:
+                container = built[parents[i] - node]
+                if isinstance(container, dict):
+                    container[self.keys[key_ids[i]]] = value
+                else:
+                    container.append(value)
+            built.append(value)
+        return built[0]
+
+    def string_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """
+        Returns a boolean array over the nodes marking the string leaves for which `predicate` is true.
+        The predicate is evaluated once per distinct string rather than once per leaf.
+        """
+        hits = np.fromiter((bool(predicate(s)) for s in self.strings), dtype=bool, count=len(self.strings))
+        mask = self.types == FLAT_STR
+        mask[mask] = hits[self.payloads[mask]]
+        return mask
+
+    def key_mask(self, predicate: Callable[[str], bool]) -> np.ndarray:
+        """
+        Returns a boolean array over the nodes marking the dict members whose key satisfies `predicate`.
+        """
+        return self._member_mask(np.fromiter((bool(predicate(k)) for k in self.keys), dtype=bool, count=len(self.keys)))
+
+    def _member_mask(self, key_hits: np.ndarray) -> np.ndarray:
+        # Marks the dict members whose key id is set in `key_hits`.
+        mask = np.zeros(len(self.types), dtype=bool)
+        mask[1:] = self.types[self.parents[1:]] == FLAT_DICT
+        mask[mask] = key_hits[self.key_ids[mask]]
+        return mask
+
+    def value_mask(self, value: Any, ignore_case: bool = False) -> Union[np.ndarray, None]:
+        """
+        Returns a boolean array over the nodes marking the leaves equal to `value`, using Python equality semantics
+        (so 1, 1.0 and True compare equal). Returns None if `value` is a dict or list, which cannot be matched
+        against the table directly.
+        """
+        types = self.types
+        if value is None:
+            mask = types == FLAT_NULL
+        elif isinstance(value, str):
+            target = value.lower() if ignore_case else value
+            mask = self.string_mask((lambda s: s.lower() == target) if ignore_case else (lambda s: s == target))
+        elif isinstance(value, (bool, int, float)):
+            mask = ((types == FLAT_TRUE) & (value == 1)) | ((types == FLAT_FALSE) & (value == 0))
+            floats = types == FLAT_FLOAT
+            mask[floats] = self.floats[self.payloads[floats]] == value
+            if value == value and abs(value) != float("inf") and int(value) == value and -2**63 <= int(value) < 2**63:
+                ints = types == FLAT_INT
+                mask[ints] = self.payloads[ints] == int(value)
+        else:
+            return None
+        return mask
+
+    def paths_where(self, mask: np.ndarray, with_values: bool = False, prune: bool = False) -> Generator[Any, None, None]:
+        """
+        Yields the paths of the nodes marked in `mask`, in document order. The root node is never reported.
+
+        Parameters:
+        - mask (np.ndarray): A boolean array over the nodes, as returned by string_mask, key_mask or value_mask.
+        - with_values (bool, optional): Whether to yield (path, value) tuples instead of paths. Defaults to False.
+        - prune (bool, optional): Whether to skip marked nodes nested inside another marked node. Defaults to False.
+        """
+        subtree_end = 0
+        for node in np.flatnonzero(mask[1:]) + 1:
+            node = int(node)
+            if prune:
+                if node < subtree_end:
+                    continue
+                subtree_end = int(self.ends[node])
+            yield (self.path(node), self.to_python(node)) if with_values else self.path(node)
+
+    def range_index(self, kind: str) -> dict:
+        """
+        Returns, for every key path (the dict keys from the root, list indices left out), a pair of arrays
+        (sorted values, node ids) over the numeric leaves (kind "number") or the ISO date strings (kind "date").
+        The index is built on first use and cached.
+        """
+        if kind in self._range_indexes:
+            return self._range_indexes[kind]
+
+        # Intern the key path of every node, walking the table in pre-order so parents come first
+        key_path_ids = np.empty(len(self.types), dtype=np.int64)
+        key_paths, key_path_index = [()], {}
+        parents, key_ids, types = self.parents.tolist(), self.key_ids.tolist(), self.types.tolist()
+        key_path_ids[0] = 0
+        for node in range(1, len(types)):
+            parent_id = int(key_path_ids[parents[node]])
+            if types[parents[node]] != FLAT_DICT:
+                key_path_ids[node] = parent_id
+                continue
+            entry = (parent_id, key_ids[node])
+            key_path_id = key_path_index.get(entry)
+            if key_path_id is None:
+                key_path_id = key_path_index[entry] = len(key_paths)
+                key_paths.append(key_paths[parent_id] + (self.keys[key_ids[node]],))
+            key_path_ids[node] = key_path_id
+
+        if kind == "number":
+            nodes = np.flatnonzero((self.types == FLAT_INT) | (self.types == FLAT_FLOAT))
+            values = self.payloads[nodes].astype(np.float64)
+            floats = self.types[nodes] == FLAT_FLOAT
+            values[floats] = self.floats[self.payloads[nodes[floats]]]
+            valid = ~np.isnan(values)  # NaN never falls inside a range
+            nodes, values = nodes[valid], values[valid]
+        elif kind == "date":
+            parsed = [_parse_iso_datetime(s) for s in self.strings]
+            dates = np.array([np.datetime64(d, "us") if d is not None else np.datetime64("NaT") for d in parsed], dtype="datetime64[us]")
+            nodes = np.flatnonzero(self.types == FLAT_STR)
+            values = dates[self.payloads[nodes]]
+            valid = ~np.isnat(values)
+            nodes, values = nodes[valid], values[valid]
+        else:
+            raise ValueError("'kind' must be 'number' or 'date'.")
+
+        index = {}
+        groups = key_path_ids[nodes]
+        order = np.lexsort((values, groups))
+        nodes, values, groups = nodes[order], values[order], groups[order]
+        boundaries = np.flatnonzero(np.diff(groups)) + 1
+        for start, stop in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(nodes)]))):
+            if stop > start:
+                index[key_paths[groups[start]]] = (values[start:stop], nodes[start:stop])
+        self._range_indexes[kind] = index
+        return index
+
+    def save(self, file_path: str) -> None:
+        """
+        Writes the node table to `file_path` in a layout that load_flat_json can memory-map.
+        """
+        arrays = [(name, np.ascontiguousarray(getattr(self, name), dtype=dtype)) for name, dtype in _FLAT_ARRAYS]
+        header = {"version": 1, "arrays": {}}
+        offset = 0
+        for name, array in arrays:
+            header["arrays"][name] = [array.dtype.str, offset, len(array)]
+            offset += -(-array.nbytes // 8) * 8
+        header_bytes = json.dumps(header).encode("utf-8")
+        data_start = -(-(len(_FLAT_MAGIC) + 8 + len(header_bytes)) // 8) * 8
+        with open(file_path, "wb") as f:
+            f.write(_FLAT_MAGIC)
+            f.write(len(header_bytes).to_bytes(8, "little"))
+            f.write(header_bytes)
+            f.write(b"\0" * (data_start - f.tell()))
+            for name, array in arrays:
+                f.write(array.tobytes())
+                f.write(b"\0" * (-array.nbytes % 8))
+
+
+def flatten_json(json_obj: Union[dict, list]) -> FlatJSON:
+    """
+    Flattens a nested dictionary or list into a FlatJSON node table.
+
+    Parameters:
+    - json_obj (Union[dict, list]): The JSON object to flatten. Dict keys must be strings.
+
+    Returns:
+    - FlatJSON: The flattened document. Integers outside the 64-bit range are stored as floats.
+
+    Examples:
+    >>> flat = flatten_json([{'key': 'value'}, {'key': 'value2'}])
+    >>> list(find_all_paths_of_key('key', flat))
+    [[0, 'key'], [1, 'key']]
+    """
+    parents, key_ids, types, payloads, ends, floats = [], [], [], [], [], []
+    keys, key_index = [], {}
+    strings, string_index = [], {}
+
+    def intern(table: List[str], index: dict, s: str) -> int:
+        i = index.get(s)
+        if i is None:
+            i = index[s] = len(table)
+            table.append(s)
+        return i
+
+    def visit(obj: Any, parent: int, slot: int) -> None:
+        node = len(types)
+        parents.append(parent)
+        key_ids.append(slot)
+        ends.append(0)
+        if isinstance(obj, dict):
+            types.append(FLAT_DICT)
+            payloads.append(len(obj))
+            for k, v in obj.items():
+                if not isinstance(k, str):
+                    raise TypeError(f"Keys must be str, not {type(k).__name__}")
+                visit(v, node, intern(keys, key_index, k))
+        elif isinstance(obj, list):
+            types.append(FLAT_LIST)
+            payloads.append(len(obj))
+            for idx, item in enumerate(obj):
+                visit(item, node, idx)
+        elif obj is None:
+            types.append(FLAT_NULL)
+            payloads.append(0)
+        elif isinstance(obj, bool):
+            types.append(FLAT_TRUE if obj else FLAT_FALSE)
+            payloads.append(0)
+        elif isinstance(obj, int) and -2**63 <= obj < 2**63:
+            types.append(FLAT_INT)
+            payloads.append(obj)
+        elif isinstance(obj, (int, float)):
+            types.append(FLAT_FLOAT)
+            payloads.append(len(floats))
+            floats.append(float(obj))
+        elif isinstance(obj, str):
+            types.append(FLAT_STR)
+            payloads.append(intern(strings, string_index, obj))
+        else:
+            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+        ends[node] = len(types)
+
+    visit(json_obj, -1, -1)
+    key_offsets, key_data = _encode_string_table(keys)
+    string_offsets, string_data = _encode_string_table(strings)
+    flat = FlatJSON(np.array(parents, dtype="<i4"), np.array(key_ids, dtype="<i4"), np.array(types, dtype="u1"),
+                    np.array(payloads, dtype="<i8"), np.array(ends, dtype="<i4"), np.array(floats, dtype="<f8"),
+                    key_offsets, key_data, string_offsets, string_data)
+    flat._strings = strings
+    return flat
+
+
+def load_flat_json(file_path: str, mmap: bool = True) -> FlatJSON:
+    """
+    Loads a FlatJSON written by FlatJSON.save.
+
+    Parameters:
+    - file_path (str): The file to load.
+    - mmap (bool, optional): Whether to memory-map the file instead of reading it into memory. Defaults to True.
+
+    Returns:
+    - FlatJSON: The node table, backed by the mapped file when `mmap` is True.
+    """
+    buffer = np.memmap(file_path, dtype="u1", mode="r") if mmap else np.fromfile(file_path, dtype="u1")
+    if buffer[:len(_FLAT_MAGIC)].tobytes() != _FLAT_MAGIC:
+        raise ValueError(f"{file_path} is not a flattened JSON file.")
+    header_start = len(_FLAT_MAGIC) + 8
+    header_len = int.from_bytes(buffer[len(_FLAT_MAGIC):header_start].tobytes(), "little")
+    header = json.loads(buffer[header_start:header_start + header_len].tobytes().decode("utf-8"))
+    if header.get("version") != 1:
+        raise ValueError(f"Unsupported flattened JSON version: {header.get('version')}")
+    data_start = -(-(header_start + header_len) // 8) * 8
+    arrays = {}
+    for name, (dtype, offset, count) in header["arrays"].items():
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + offset)
+    return FlatJSON(**arrays)
+
+
+
+_PIPELINE_END = object()  # Marks the end of a stage's input
+
+
+class _PipelineStopped(Exception):
+    # Raised inside a stage when the stage after it has stopped consuming.
+    pass
+
+
+class _BoundedChannel:
+    # A bounded queue between two pipeline stages. The consumer closes it when it stops early,
+    # which makes the producer's next put raise _PipelineStopped instead of blocking forever.
+    def __init__(self, maxsize: int):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.closed = threading.Event()
+
+    def put(self, item: Any) -> None:
+        while not self.closed.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)  # Blocks while full (backpressure)
+                return
+            except queue.Full:
+                pass
+        raise _PipelineStopped()
+
+    def get(self) -> Any:
+        return self.queue.get()
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+def _read_checkpoint(checkpoint_path: str) -> Tuple[set, List[dict], int]:
+    # Helper function to read the completed sources and committed chunks from a checkpoint file,
+    # along with the size in bytes of its readable part. A line cut short by an interruption ends the readable part.
+    done_sources, commits, good_size = set(), [], 0
+    if checkpoint_path is None or not os.path.exists(checkpoint_path):
+        return done_sources, commits, good_size
+    with open(checkpoint_path, "rb") as f:
+        for line in f:
+            try:
+                commit = json.loads(line) if line.endswith(b"\n") else None
+            except ValueError:
+                commit = None
+            if not isinstance(commit, dict) or "sources" not in commit:
+                break
+            done_sources.update(commit["sources"])
+            commits.append(commit)
+            good_size += len(line)
+    return done_sources, commits, good_size
+
+
+def _cell_text(value: Any) -> Union[str, None]:
+    # Helper function to store a cell of any JSON type in a string column. Dicts and lists are stored as JSON.
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def _row_key(data: list) -> tuple:
+    # Helper function to build a hashable key for deduplicating a row whose values may be dicts or lists.
+    return tuple(v if isinstance(v, (str, int, float, bool, type(None))) else json.dumps(v, sort_keys=True, default=str) for v in data)
+
+
+class _CsvChunkWriter:
+    # Appends row chunks to a CSV file. Resuming truncates anything written after the last checkpointed chunk.
+    def __init__(self, output_path: str, columns: List[str], commits: List[dict]):
+        self.columns = columns
+        offset = commits[-1]["offset"] if commits else 0
+        if commits and (not os.path.exists(output_path) or os.path.getsize(output_path) < offset):
+            raise ValueError(f"{output_path} is missing or shorter than its checkpoint records. Delete the checkpoint file to start over.")
+        self.file = open(output_path, "r+b" if commits else "wb")
+        self.file.truncate(offset)
+        self.file.seek(offset)
+        if offset == 0:
+            self.write([])  # Header only
+
+    def write(self, rows: List[list]) -> dict:
+        text = pd.DataFrame(rows, columns=self.columns).to_csv(index=False, header=self.file.tell() == 0)
+        self.file.write(text.encode("utf-8"))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"offset": self.file.tell()}
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ParquetChunkWriter:
+    # Writes each row chunk as a part file of a Parquet dataset directory. Resuming removes parts that were never checkpointed.
+    # Every part uses the same all-string schema, so parts whose columns happen to be all None still read back as one dataset.
+    def __init__(self, output_path: str, columns: List[str], commits: List[dict]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa, self.pq = pa, pq
+        self.schema = pa.schema([(column, pa.string()) for column in columns])
+        self.output_path = output_path
+        self.columns = columns
+        committed = {commit["part"] for commit in commits if commit.get("part")}
+        os.makedirs(output_path, exist_ok=True)
+        for name in os.listdir(output_path):
+            if name.startswith("part-") and name not in committed:
+                os.remove(os.path.join(output_path, name))
+        self.part_number = len(committed)
+
+    def write(self, rows: List[list]) -> dict:
+        if not rows:
+            return {"part": None}
+        name = f"part-{self.part_number:05d}.parquet"
+        tmp_path = os.path.join(self.output_path, f".{name}.tmp")
+        table = self.pa.Table.from_arrays([self.pa.array([_cell_text(row[i]) for row in rows], self.pa.string()) for i in range(len(self.columns))],
+                                          schema=self.schema)
+        self.pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.output_path, name))
+        self.part_number += 1
+        return {"part": name}
+
+    def close(self) -> None:
+        pass
+
+
+def stream_extract_to_file(sources: Iterable[str], fetch: Callable[[str], Union[dict, list]], target_values: List[Any], keys_to_extract: List[str], output_path: str, find_paths: Callable = find_all_paths_of_value_substring, find_kwargs: dict = None, source_column: str = "source", chunk_size: int = 500, queue_size: int = 4, checkpoint_path: str = None) -> int:
+    """
+    Fetches, searches and writes documents one at a time through a pipeline of threads connected by bounded queues, so rows reach disk as they are produced and memory stays flat.
+
+    The stages are: fetch each source -> search it for every target value -> look up `keys_to_extract` around each match
+    with search_key_in_all_levels -> drop duplicate rows within the source -> append the rows in chunks to `output_path`.
+    A stage blocks when the queue in front of it is full, so a slow writer throttles fetching.
+
+    Parameters:
+    - sources (Iterable[str]): The identifiers to fetch (for example ORCIDs).
+    - fetch (Callable[[str], Union[dict, list]]): Function returning the JSON object for a source.
+    - target_values (List[Any]): The values to search for in each document.
+    - keys_to_extract (List[str]): The keys to record for each match. Matches missing any of them are skipped.
+    - output_path (str): The CSV file to write, or a directory ending in ".parquet" to write as a Parquet dataset (requires pyarrow).
+      Parquet columns are strings, with dict and list values stored as JSON.
+    - find_paths (Callable, optional): The search function, called as find_paths(target_value, document, **find_kwargs).
+      It may yield paths or (path, matched_value) tuples. Defaults to find_all_paths_of_value_substring.
+    - find_kwargs (dict, optional): Extra keyword arguments for find_paths. Defaults to None.
+    - source_column (str, optional): The name of the column holding the source identifier. Defaults to "source".
+    - chunk_size (int, optional): The number of rows buffered before a chunk is written. Chunks always end on a source boundary. Defaults to 500.
+    - queue_size (int, optional): The capacity of each queue between stages. Defaults to 4.
+    - checkpoint_path (str, optional): A file recording the sources whose rows have been written. If it exists, those sources are skipped
+      and output written after the last checkpoint is discarded, so an interrupted run can be resumed. Defaults to None (start over).
+
+    Returns:
+    - int: The number of rows written by this run.
+
+    Examples:
+    >>> import tempfile
+    >>> out_dir = tempfile.mkdtemp()
+    >>> output, checkpoint = os.path.join(out_dir, 'out.csv'), os.path.join(out_dir, 'out.checkpoint')
+    >>> works = {'a': [{'title': 'CZI grant', 'ids': {'doi': '10.1/a'}}], 'b': [{'title': 'Biohub lab', 'ids': {}}]}
+    >>> options = {'find_kwargs': {'match_type': 'substring'}, 'checkpoint_path': checkpoint}
+    >>> stream_extract_to_file(['a'], works.get, ['CZI', 'Biohub'], ['ids'], output, **options)
+    1
+    >>> stream_extract_to_file(['a', 'b'], works.get, ['CZI', 'Biohub'], ['ids'], output, **options)  # Resumes after 'a'
+    1
+    >>> print(open(output).read(), end='')
+    source,searched_value,matched_value,path,ids
+    a,CZI,CZI grant,"[0, 'title']",{'doi': '10.1/a'}
+    b,Biohub,Biohub lab,"[0, 'title']",{}
+    """
+    find_kwargs = find_kwargs or {}
+    columns = [source_column, "searched_value", "matched_value", "path"] + keys_to_extract
+    done_sources, commits, good_size = _read_checkpoint(checkpoint_path)
+    if checkpoint_path is not None:
+        with open(checkpoint_path, "ab") as f:
+            f.truncate(good_size)  # Drop any unreadable remains of a previous run before appending to it
+
+    errors = []
+    documents = _BoundedChannel(queue_size)
+    hits = _BoundedChannel(queue_size * 64)
+    rows = _BoundedChannel(queue_size * 64)
+
+    def run_stage(stage: Callable[[], None], input_channel: _BoundedChannel, output_channel: _BoundedChannel) -> None:
+        # A failing stage stops the stages before it and lets the stages after it finish the work already handed on.
+        try:
+            stage()
+        except _PipelineStopped:
+            if input_channel is not None:
+                input_channel.close()
+        except BaseException as e:
+            errors.append(e)
+            if input_channel is not None:
+                input_channel.close()
+            try:
+                output_channel.put(_PIPELINE_END)
+            except _PipelineStopped:
+                pass
+
+    def produce() -> None:
+        for source in sources:
+            if source not in done_sources:
+                documents.put((source, fetch(source)))
+        documents.put(_PIPELINE_END)
+
+    def search() -> None:
+        while True:
+            item = documents.get()
+            if item is _PIPELINE_END:
+                hits.put(_PIPELINE_END)
+                return
+            source, document = item
+            for target_value in target_values:
+                for found in find_paths(target_value, document, **find_kwargs):
+                    path, matched_value = found if isinstance(found, tuple) else (found, target_value)
+                    hits.put((source, (document, target_value, matched_value, path)))
+            hits.put((source, None))  # Source finished
+
+    def resolve_keys() -> None:
+        while True:
+            item = hits.get()
+            if item is _PIPELINE_END:
+                rows.put(_PIPELINE_END)
+                return
+            source, hit = item
+            if hit is None:
+                rows.put(item)
+                continue
+            document, target_value, matched_value, path = hit
+            data = [source, target_value, matched_value, str(path)]
+            for key in keys_to_extract:
+                key_results = search_key_in_all_levels(document, [path], key)
+                if not key_results:
+                    break
+                data.append(key_results[0].value)
+            else:
+                rows.put((source, data))
+
+    stages = [(produce, None, documents), (search, documents, hits), (resolve_keys, hits, rows)]
+    threads = [threading.Thread(target=run_stage, args=stage, daemon=True) for stage in stages]
+    for thread in threads:
+        thread.start()
+
+    # Dedup and write in this thread. Rows are only written once their source is finished, so every chunk ends on a source boundary.
+    writer = None
+    rows_written = 0
+    try:
+        writer_class = _ParquetChunkWriter if output_path.rstrip("/\\").endswith(".parquet") else _CsvChunkWriter
+        writer = writer_class(output_path, columns, commits)
+        buffer, finished_sources = [], []
+        source_rows, unique_rows = [], set()
+        while True:
+            item = rows.get()
+            if item is not _PIPELINE_END:
+                source, data = item
+                if data is not None:
+                    row_tuple = _row_key(data)
+                    if row_tuple not in unique_rows:
+                        unique_rows.add(row_tuple)
+                        source_rows.append(data)
+                    continue
+                buffer.extend(source_rows)
+                finished_sources.append(source)
+                source_rows, unique_rows = [], set()
+            if finished_sources and (len(buffer) >= chunk_size or item is _PIPELINE_END):
+                commit = writer.write(buffer)
+                rows_written += len(buffer)
+                if checkpoint_path is not None:
+                    commit["sources"] = finished_sources
+                    with open(checkpoint_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(commit) + "\n")
+                buffer, finished_sources = [], []
+            if item is _PIPELINE_END:
+                break
+    finally:
+        rows.close()
+        if writer is not None:
+            writer.close()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return rows_written